@@ -1,10 +1,11 @@
 import os
 import logging
+import click
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
-from flask_mail import Mail
-from flask_wtf.csrf import CSRFProtect
+from flask_caching import Cache
+from sqlalchemy import event
 from sqlalchemy.orm import DeclarativeBase
 from werkzeug.middleware.proxy_fix import ProxyFix
 
@@ -17,8 +18,10 @@ class Base(DeclarativeBase):
 # Initialize extensions
 db = SQLAlchemy(model_class=Base)
 login_manager = LoginManager()
-mail = Mail()
-csrf = CSRFProtect()
+cache = Cache()
+mail = None  # created on first use by get_mail()
+queue = None  # created on first use by get_queue()
+csrf = None
 
 # Create the app
 app = Flask(__name__)
@@ -26,16 +29,52 @@ app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key-change-in-prod
 app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
 
 # Configuration
-app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "sqlite:///quickdesk.db")
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-    "pool_recycle": 300,
-    "pool_pre_ping": True,
-}
+database_url = os.environ.get("DATABASE_URL", "sqlite:///quickdesk.db")
+app.config["SQLALCHEMY_DATABASE_URI"] = database_url
+if database_url.startswith("sqlite"):
+    if database_url in ("sqlite://", "sqlite:///:memory:"):
+        # In-memory databases only exist on one connection, so share it across threads
+        from sqlalchemy.pool import StaticPool
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+            "poolclass": StaticPool,
+            "connect_args": {"check_same_thread": False},
+        }
+    else:
+        # File databases keep the default pool; there is no server connection to recycle or ping
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {}
+else:
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+        "pool_size": 20,
+        "max_overflow": 10,
+        "pool_timeout": 30,
+        "pool_recycle": 1800,
+        "pool_pre_ping": True,
+    }
+# Room for every statement shape the app compiles, so none are evicted and recompiled
+app.config["SQLALCHEMY_ENGINE_OPTIONS"]["query_cache_size"] = 1200
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
+# CSRF tokens are tied to the session, so skip the extra per-token expiry check
+app.config["WTF_CSRF_TIME_LIMIT"] = None
+
+# Password hashing: werkzeug's scrypt costs about 100ms per check, where the older
+# pbkdf2 hashes take several times longer; hashes made with other settings are upgraded on login
+app.config["PASSWORD_HASH_METHOD"] = "scrypt:32768:8:1"
+
 # File upload configuration
 app.config["UPLOAD_FOLDER"] = "uploads"
 app.config["MAX_CONTENT_LENGTH"] = 16 * 1024 * 1024  # 16MB max file size
+# Hand attachment downloads to the front-end server instead of streaming them from a worker:
+# USE_X_SENDFILE=1 for Apache/lighttpd, or X_ACCEL_REDIRECT_PREFIX=/protected-uploads/ for an
+# nginx internal location that points at UPLOAD_FOLDER
+app.config["USE_X_SENDFILE"] = os.environ.get("USE_X_SENDFILE") == "1"
+app.config["X_ACCEL_REDIRECT_PREFIX"] = os.environ.get("X_ACCEL_REDIRECT_PREFIX", "")
+
+# Cache configuration (SimpleCache is per process; use CACHE_TYPE=RedisCache to share it between workers,
+# which also turns on caching of the rendered ticket list and dashboard pages)
+app.config["CACHE_TYPE"] = os.environ.get("CACHE_TYPE", "SimpleCache")
+app.config["CACHE_REDIS_URL"] = os.environ.get("REDIS_URL", "redis://localhost:6379/0")
+app.config["CACHE_DEFAULT_TIMEOUT"] = 30
 
 # Mail configuration (mocked for MVP)
 app.config["MAIL_SERVER"] = "smtp.gmail.com"
@@ -48,8 +87,50 @@ app.config["MAIL_DEFAULT_SENDER"] = os.environ.get("MAIL_DEFAULT_SENDER", "norep
 # Initialize extensions with app
 db.init_app(app)
 login_manager.init_app(app)
-mail.init_app(app)
-csrf.init_app(app)
+cache.init_app(app)
+
+# SQLite connection tuning: WAL lets readers run alongside a writer and
+# synchronous=NORMAL avoids an fsync on every commit
+SQLITE_PRAGMAS = (
+    "journal_mode=WAL",
+    "synchronous=NORMAL",
+    "temp_store=MEMORY",
+    "cache_size=-20000",
+    "mmap_size=268435456",
+    "foreign_keys=ON",
+)
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for pragma in SQLITE_PRAGMAS:
+        cursor.execute(f"PRAGMA {pragma}")
+        cursor.fetchall()
+    cursor.close()
+
+with app.app_context():
+    if db.engine.dialect.name == "sqlite":
+        event.listen(db.engine, "connect", _set_sqlite_pragmas)
+
+if app.config.get("WTF_CSRF_ENABLED", True):
+    from flask_wtf.csrf import CSRFProtect
+    csrf = CSRFProtect(app)
+
+def get_mail():
+    """Return the Mail extension, importing Flask-Mail only when mail is actually sent"""
+    global mail
+    if mail is None:
+        from flask_mail import Mail
+        mail = Mail(app)
+    return mail
+
+def get_queue():
+    """Return the RQ queue for background jobs, or None to run them inline when REDIS_URL is not set"""
+    global queue
+    if queue is None and os.environ.get("REDIS_URL"):
+        from redis import Redis
+        from rq import Queue
+        queue = Queue("emails", connection=Redis.from_url(os.environ["REDIS_URL"]))
+    return queue
 
 # Login manager configuration
 login_manager.login_view = "login"
@@ -59,46 +140,81 @@ login_manager.login_message_category = "info"
 @login_manager.user_loader
 def load_user(user_id):
     from models import User
-    return User.query.get(int(user_id))
+    return db.session.get(User, int(user_id))
 
 # Create upload directory
 os.makedirs(app.config["UPLOAD_FOLDER"], exist_ok=True)
 
-with app.app_context():
+def _insert_ignore(model, rows):
+    """Insert rows in one statement, skipping any that hit a unique constraint"""
+    dialect = db.engine.dialect.name
+    if dialect in ("mysql", "mariadb"):
+        from sqlalchemy import insert
+        stmt = insert(model.__table__).values(rows).prefix_with("IGNORE")
+    else:
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        stmt = insert(model.__table__).values(rows).on_conflict_do_nothing()
+    db.session.execute(stmt)
+
+def bootstrap_database(force=False):
+    """Create missing tables and the default admin user and categories"""
     # Import models to create tables
-    import models  # noqa: F401
-    db.create_all()
-    
-    # Create default admin user and categories
-    from models import User, Category
-    from werkzeug.security import generate_password_hash
+    import models
+    # One table listing instead of a metadata check per table on every start
+    table_names = set(db.inspect(db.engine).get_table_names())
+    if set(db.metadata.tables) - table_names:
+        db.create_all()
     
-    # Create default admin if not exists
-    admin_user = User.query.filter_by(email="admin@quickdesk.com").first()
-    if not admin_user:
-        admin_user = User(
-            username="admin",
-            email="admin@quickdesk.com",
-            password_hash=generate_password_hash("admin123"),
-            role="admin",
-            first_name="System",
-            last_name="Administrator"
-        )
-        db.session.add(admin_user)
+    # Databases created by earlier versions need the new ticket columns and indexes added in place
+    if "ticket" in table_names:
+        with db.engine.begin() as connection:
+            models.upgrade_ticket_table(connection)
+            models.create_missing_indexes(
+                connection, [table for table in db.metadata.sorted_tables if table.name in table_names]
+            )
     
-    # Create default categories if not exists
-    default_categories = [
-        {"name": "Technical Support", "description": "Technical issues and troubleshooting"},
-        {"name": "Account Issues", "description": "Login, password, and account related problems"},
-        {"name": "Feature Request", "description": "Suggestions for new features"},
-        {"name": "Bug Report", "description": "Report software bugs and issues"},
-        {"name": "General Inquiry", "description": "General questions and information"}
-    ]
+    # SQLite databases created before full-text search need the search table filled in
+    if db.engine.dialect.name == "sqlite" and "ticket_fts" not in table_names:
+        with db.engine.begin() as connection:
+            models.create_search_index(connection, rebuild=True)
     
-    for cat_data in default_categories:
-        if not Category.query.filter_by(name=cat_data["name"]).first():
-            category = Category(name=cat_data["name"], description=cat_data["description"])
-            db.session.add(category)
+    from models import BootstrapMarker
     
-    db.session.commit()
-    logging.info("Database initialized with default data")
+    # Default data only needs to be written once; set QUICKDESK_BOOTSTRAP to force it
+    if force or os.environ.get("QUICKDESK_BOOTSTRAP") or not db.session.query(BootstrapMarker.query.exists()).scalar():
+        from werkzeug.security import generate_password_hash
+        from models import User, Category
+        
+        # Create default admin if not exists
+        _insert_ignore(User, [{
+            "username": "admin",
+            "email": "admin@quickdesk.com",
+            "password_hash": generate_password_hash("admin123", method=app.config["PASSWORD_HASH_METHOD"]),
+            "role": "admin",
+            "first_name": "System",
+            "last_name": "Administrator"
+        }])
+        
+        # Create default categories if not exists
+        default_categories = [
+            {"name": "Technical Support", "description": "Technical issues and troubleshooting"},
+            {"name": "Account Issues", "description": "Login, password, and account related problems"},
+            {"name": "Feature Request", "description": "Suggestions for new features"},
+            {"name": "Bug Report", "description": "Report software bugs and issues"},
+            {"name": "General Inquiry", "description": "General questions and information"}
+        ]
+        _insert_ignore(Category, default_categories)
+        
+        if not db.session.get(BootstrapMarker, 1):
+            db.session.add(BootstrapMarker(id=1))
+        db.session.commit()
+        logging.info("Database initialized with default data")
+
+@app.cli.command("bootstrap")
+@click.option("--force", is_flag=True, help="Re-insert the default data even if it was created before.")
+def bootstrap_command(force):
+    """Create the database tables and default data (run once per deployment)."""
+    bootstrap_database(force=force)
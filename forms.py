@@ -1,10 +1,61 @@
+import time
 from flask_wtf import FlaskForm
 from flask_wtf.file import FileField, FileAllowed
 from wtforms import StringField, TextAreaField, SelectField, PasswordField, BooleanField, HiddenField
 from wtforms.validators import DataRequired, Email, Length, EqualTo, Optional
 from wtforms.widgets import TextArea
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from app import db
 from models import Category, User
 
+# Short-lived cache for database-backed dropdown choices
+CHOICE_CACHE_TTL = 60  # seconds
+AGENT_ROLES = ('agent', 'admin')
+_choice_cache = {}
+
+def _cached_choices(key, loader):
+    """Return cached (id, label) choices, reloading them once the TTL expires"""
+    entry = _choice_cache.get(key)
+    now = time.monotonic()
+    if entry is None or now - entry[0] > CHOICE_CACHE_TTL:
+        entry = (now, loader())
+        _choice_cache[key] = entry
+    return entry[1]
+
+def _get_active_categories():
+    """Get (id, name) choices for active categories"""
+    return _cached_choices('categories', lambda: [tuple(row) for row in db.session.execute(
+        select(Category.id, Category.name).where(Category.is_active.is_(True))
+    )])
+
+def _get_agents():
+    """Get (id, full name) choices for users who can be assigned tickets"""
+    return _cached_choices('agents', lambda: [tuple(row) for row in db.session.execute(
+        select(User.id, User.full_name).where(User.role.in_(AGENT_ROLES))
+    )])
+
+def _bust_categories(mapper, connection, target):
+    _choice_cache.pop('categories', None)
+
+def _bust_agents(mapper, connection, target):
+    _choice_cache.pop('agents', None)
+
+for _event in ('after_insert', 'after_update', 'after_delete'):
+    event.listen(Category, _event, _bust_categories)
+    event.listen(User, _event, _bust_agents)
+
+def _bust_on_bulk_change(orm_execute_state):
+    """Bulk update()/delete() statements skip the mapper events above"""
+    if orm_execute_state.is_update or orm_execute_state.is_delete:
+        for mapper in orm_execute_state.all_mappers:
+            if mapper.class_ is Category:
+                _choice_cache.pop('categories', None)
+            elif mapper.class_ is User:
+                _choice_cache.pop('agents', None)
+
+event.listen(Session, 'do_orm_execute', _bust_on_bulk_change)
+
 class LoginForm(FlaskForm):
     username = StringField('Username or Email', validators=[DataRequired(), Length(min=3, max=80)])
     password = PasswordField('Password', validators=[DataRequired()])
@@ -42,7 +93,7 @@ class TicketForm(FlaskForm):
     
     def __init__(self, *args, **kwargs):
         super(TicketForm, self).__init__(*args, **kwargs)
-        self.category_id.choices = [(c.id, c.name) for c in Category.query.filter_by(is_active=True).all()]
+        self.category_id.choices = _get_active_categories()
 
 class TicketUpdateForm(FlaskForm):
     status = SelectField('Status', choices=[
@@ -62,8 +113,7 @@ class TicketUpdateForm(FlaskForm):
     def __init__(self, *args, **kwargs):
         super(TicketUpdateForm, self).__init__(*args, **kwargs)
         # Only agents and admins can be assigned tickets
-        agents = User.query.filter(User.role.in_(['agent', 'admin'])).all()
-        self.assigned_to.choices = [(0, 'Unassigned')] + [(a.id, a.full_name) for a in agents]
+        self.assigned_to.choices = [(0, 'Unassigned'), *_get_agents()]
 
 class CommentForm(FlaskForm):
     content = TextAreaField('Comment', validators=[DataRequired(), Length(min=1)], 
@@ -118,9 +168,8 @@ class SearchForm(FlaskForm):
     
     def __init__(self, *args, **kwargs):
         super(SearchForm, self).__init__(*args, **kwargs)
-        self.category_id.choices = [(0, 'All Categories')] + [(c.id, c.name) for c in Category.query.filter_by(is_active=True).all()]
-        agents = User.query.filter(User.role.in_(['agent', 'admin'])).all()
-        self.assigned_to.choices = [(0, 'All Assignees')] + [(a.id, a.full_name) for a in agents]
+        self.category_id.choices = [(0, 'All Categories'), *_get_active_categories()]
+        self.assigned_to.choices = [(0, 'All Assignees'), *_get_agents()]
 
 class VoteForm(FlaskForm):
     ticket_id = HiddenField('Ticket ID', validators=[DataRequired()])
@@ -1,19 +1,82 @@
-from datetime import datetime
+from enum import IntEnum
+from sqlalchemy.dialects import sqlite
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
+from sqlalchemy import bindparam, column, event, literal_column, select, table, update
+from sqlalchemy.orm import column_property, configure_mappers, joinedload, selectinload, with_loader_criteria
 from app import db
 
+# SQLite writes func.now() as 'YYYY-MM-DD HH:MM:SS'; bind datetimes in the same
+# format so comparisons against stored timestamps (e.g. keyset pagination) line up
+Timestamp = db.DateTime().with_variant(sqlite.DATETIME(
+    storage_format="%(year)04d-%(month)02d-%(day)02d %(hour)02d:%(minute)02d:%(second)02d"
+), 'sqlite')
+
+class TicketStatus(IntEnum):
+    OPEN = 0
+    IN_PROGRESS = 1
+    RESOLVED = 2
+    CLOSED = 3
+
+class TicketPriority(IntEnum):
+    LOW = 0
+    MEDIUM = 1
+    HIGH = 2
+    URGENT = 3
+
+class EnumCode(db.TypeDecorator):
+    """Store lowercase enum names such as 'in_progress' as SmallInteger codes"""
+    impl = db.SmallInteger
+    cache_ok = True
+    
+    def __init__(self, enum_class):
+        super().__init__()
+        self.enum_class = enum_class
+    
+    def process_bind_param(self, value, dialect):
+        if value is None or isinstance(value, int):
+            return value
+        # Unknown names (e.g. from query strings) match no rows instead of raising
+        member = self.enum_class.__members__.get(value.upper())
+        return int(member) if member is not None else None
+    
+    def process_literal_param(self, value, dialect):
+        return str(self.process_bind_param(value, dialect))
+    
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        # int() as upgraded SQLite databases keep the codes in a text column
+        return self.enum_class(int(value)).name.lower()
+    
+    @property
+    def python_type(self):
+        return str
+
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    username = db.Column(db.String(80), unique=True, nullable=False)
-    email = db.Column(db.String(120), unique=True, nullable=False)
+    username = db.Column(db.String(80), nullable=False)  # unique case-insensitively, see __table_args__
+    email = db.Column(db.String(120), nullable=False)
     password_hash = db.Column(db.String(256), nullable=False)
     role = db.Column(db.String(20), nullable=False, default='user')  # user, agent, admin
     first_name = db.Column(db.String(50), nullable=False)
     last_name = db.Column(db.String(50), nullable=False)
     is_active = db.Column(db.Boolean, default=True)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = db.Column(Timestamp, nullable=False, server_default=db.func.now())
+    updated_at = db.Column(Timestamp, nullable=False, server_default=db.func.now(), onupdate=db.func.now())
+    
+    # Concatenated by the database so it can be selected and sorted on directly
+    full_name = column_property(first_name + " " + last_name)
+    
+    __table_args__ = (
+        # Case-insensitive uniqueness; lookups compare lower(username) / lower(email)
+        db.Index('ix_user_username_lower', db.func.lower(username), unique=True),
+        db.Index('ix_user_email_lower', db.func.lower(email), unique=True),
+        # Role lookups back the agent dropdowns and admin notifications
+        db.Index('ix_user_role_active', role, is_active),
+        db.Index('ix_user_agents', id,
+                 postgresql_where=db.text("role IN ('agent', 'admin') AND is_active")).ddl_if(dialect='postgresql'),
+    )
     
     # Relationships
     tickets = db.relationship('Ticket', foreign_keys='Ticket.user_id', backref='creator', lazy='dynamic')
@@ -24,9 +87,12 @@ class User(UserMixin, db.Model):
     def __repr__(self):
         return f'<User {self.username}>'
     
-    @property
-    def full_name(self):
-        return f"{self.first_name} {self.last_name}"
+    def tickets_page(self, page=1, per_page=20, count=True):
+        """Paginate the tickets created by this user, newest first"""
+        return db.paginate(
+            select(Ticket).where(Ticket.user_id == self.id).order_by(Ticket.created_at.desc()),
+            page=page, per_page=per_page, error_out=False, count=count
+        )
     
     def can_edit_ticket(self, ticket):
         """Check if user can edit a ticket"""
@@ -47,7 +113,7 @@ class Category(db.Model):
     name = db.Column(db.String(100), unique=True, nullable=False)
     description = db.Column(db.Text)
     is_active = db.Column(db.Boolean, default=True)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(Timestamp, nullable=False, server_default=db.func.now())
     
     # Relationships
     tickets = db.relationship('Ticket', backref='category', lazy='dynamic')
@@ -55,12 +121,85 @@ class Category(db.Model):
     def __repr__(self):
         return f'<Category {self.name}>'
 
+# Full-text search over subject and description. PostgreSQL uses a GIN index on this
+# document (constants are inlined so queries match the index expression exactly);
+# SQLite keeps an FTS5 table in step with triggers; other databases fall back to ILIKE
+def _search_document(subject, description):
+    return db.func.to_tsvector(
+        literal_column("'english'"),
+        db.func.coalesce(subject, literal_column("''")) + literal_column("' '")
+        + db.func.coalesce(description, literal_column("''"))
+    )
+
+ticket_fts = table('ticket_fts', column('rowid'), column('ticket_fts'))
+
+TICKET_FTS_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS ticket_fts USING fts5(subject, description, content='ticket', content_rowid='id')",
+    "CREATE TRIGGER IF NOT EXISTS ticket_fts_ai AFTER INSERT ON ticket BEGIN "
+    "INSERT INTO ticket_fts(rowid, subject, description) VALUES (new.id, new.subject, new.description); END",
+    "CREATE TRIGGER IF NOT EXISTS ticket_fts_ad AFTER DELETE ON ticket BEGIN "
+    "INSERT INTO ticket_fts(ticket_fts, rowid, subject, description) VALUES ('delete', old.id, old.subject, old.description); END",
+    "CREATE TRIGGER IF NOT EXISTS ticket_fts_au AFTER UPDATE OF subject, description ON ticket BEGIN "
+    "INSERT INTO ticket_fts(ticket_fts, rowid, subject, description) VALUES ('delete', old.id, old.subject, old.description); "
+    "INSERT INTO ticket_fts(rowid, subject, description) VALUES (new.id, new.subject, new.description); END",
+)
+
+def create_search_index(connection, rebuild=False):
+    """Create the SQLite FTS5 search table and triggers, optionally indexing existing tickets"""
+    if connection.dialect.name != 'sqlite':
+        return
+    for statement in TICKET_FTS_DDL:
+        connection.exec_driver_sql(statement)
+    if rebuild:
+        connection.exec_driver_sql("INSERT INTO ticket_fts(ticket_fts) VALUES ('rebuild')")
+
+def upgrade_ticket_table(connection):
+    """Bring a ticket table created before vote scores, comment counts and enum codes up to date"""
+    columns = {column["name"]: column["type"] for column in db.inspect(connection).get_columns("ticket")}
+    if "score" not in columns:
+        connection.exec_driver_sql("ALTER TABLE ticket ADD COLUMN score INTEGER NOT NULL DEFAULT 0")
+        connection.exec_driver_sql("UPDATE ticket SET score = COALESCE(upvotes, 0) - COALESCE(downvotes, 0)")
+    if "comment_count" not in columns:
+        connection.exec_driver_sql("ALTER TABLE ticket ADD COLUMN comment_count INTEGER NOT NULL DEFAULT 0")
+        connection.exec_driver_sql(
+            "UPDATE ticket SET comment_count = "
+            "(SELECT COUNT(*) FROM ticket_comment WHERE ticket_comment.ticket_id = ticket.id)"
+        )
+    
+    # Status and priority used to be stored as names such as 'in_progress'
+    dialect = connection.dialect.name
+    for name, enum_class, null in (("status", TicketStatus, "NOT NULL"), ("priority", TicketPriority, "NULL")):
+        if not isinstance(columns[name], db.String):
+            continue
+        whens = " ".join(f"WHEN '{member.name.lower()}' THEN '{member.value}'" for member in enum_class)
+        connection.exec_driver_sql(f"UPDATE ticket SET {name} = CASE {name} {whens} ELSE {name} END")
+        # SQLite can't change a column's type, so there the codes stay in the text column
+        if dialect == "postgresql":
+            connection.exec_driver_sql(f"ALTER TABLE ticket ALTER COLUMN {name} TYPE SMALLINT USING {name}::smallint")
+        elif dialect in ("mysql", "mariadb"):
+            connection.exec_driver_sql(f"ALTER TABLE ticket MODIFY {name} SMALLINT {null}")
+
+def create_missing_indexes(connection, tables):
+    """Create the indexes of existing tables that were added after the tables were created"""
+    if connection.dialect.name != 'sqlite':
+        for table in tables:
+            for index in table.indexes:
+                index.create(connection, checkfirst=True)
+        return
+    # SQLite reflection skips expression indexes such as lower(email), so read the catalog instead
+    existing = set(connection.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'index'").scalars())
+    for table in tables:
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(connection)
+
+
 class Ticket(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     subject = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text, nullable=False)
-    status = db.Column(db.String(20), nullable=False, default='open')  # open, in_progress, resolved, closed
-    priority = db.Column(db.String(10), default='medium')  # low, medium, high, urgent
+    status = db.Column(EnumCode(TicketStatus), nullable=False, default='open')  # open, in_progress, resolved, closed
+    priority = db.Column(EnumCode(TicketPriority), default='medium')  # low, medium, high, urgent
     
     # Foreign keys
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -68,49 +207,154 @@ class Ticket(db.Model):
     assigned_to = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
     
     # Timestamps
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = db.Column(Timestamp, nullable=False, server_default=db.func.now())
+    updated_at = db.Column(Timestamp, nullable=False, server_default=db.func.now(), onupdate=db.func.now())
     resolved_at = db.Column(db.DateTime, nullable=True)
     closed_at = db.Column(db.DateTime, nullable=True)
     
     # Vote tracking
     upvotes = db.Column(db.Integer, default=0)
     downvotes = db.Column(db.Integer, default=0)
+    score = db.Column(db.Integer, nullable=False, default=0)  # upvotes - downvotes, kept in step by adjust_votes
+    comment_count = db.Column(db.Integer, nullable=False, default=0)  # incremented by add_comment
+    
+    # Notification recipients as plain columns (loaded only on request with undefer)
+    creator_email = column_property(
+        select(User.email).where(User.id == user_id).correlate_except(User).scalar_subquery(),
+        deferred=True
+    )
+    assignee_email = column_property(
+        select(User.email).where(User.id == assigned_to).correlate_except(User).scalar_subquery(),
+        deferred=True
+    )
+    
+    # Indexes for the list/search filters and sort orders
+    __table_args__ = (
+        db.Index('ix_ticket_status_created', status, created_at.desc()),
+        # Only assigned tickets are looked up by assignee ("my tickets", assignee filter, dashboard)
+        db.Index('ix_ticket_assigned_status', assigned_to, status,
+                 postgresql_where=assigned_to.isnot(None), sqlite_where=assigned_to.isnot(None)),
+        db.Index('ix_ticket_category_id_status', category_id, status),
+        db.Index('ix_ticket_user_id_created', user_id, created_at.desc()),
+        # Keyset pagination orders by (timestamp, id)
+        db.Index('ix_ticket_created_id', created_at.desc(), id.desc()),
+        db.Index('ix_ticket_updated_id', updated_at.desc(), id.desc()),
+        db.Index('ix_ticket_score_id', score.desc(), id.desc()),
+        db.Index('ix_ticket_comment_count_id', comment_count.desc(), id.desc()),
+        db.Index('ix_ticket_search', _search_document(subject, description),
+                 postgresql_using='gin').ddl_if(dialect='postgresql'),
+    )
     
     # Relationships
-    comments = db.relationship('TicketComment', backref='ticket', lazy='dynamic', cascade='all, delete-orphan')
-    attachments = db.relationship('TicketAttachment', backref='ticket', lazy='dynamic', cascade='all, delete-orphan')
+    comments = db.relationship('TicketComment', backref='ticket', lazy='select', cascade='all, delete-orphan',
+                               order_by='TicketComment.created_at')
+    attachments = db.relationship('TicketAttachment', backref='ticket', lazy='select', cascade='all, delete-orphan')
     votes = db.relationship('TicketVote', backref='ticket', lazy='dynamic', cascade='all, delete-orphan')
     
     def __repr__(self):
         return f'<Ticket {self.id}: {self.subject}>'
     
+    # Bootstrap badge classes for status and priority
+    STATUS_BADGE_CLASSES = {
+        'open': 'bg-primary',
+        'in_progress': 'bg-warning text-dark',
+        'resolved': 'bg-success',
+        'closed': 'bg-secondary'
+    }
+    PRIORITY_BADGE_CLASSES = {
+        'low': 'bg-light text-dark',
+        'medium': 'bg-info',
+        'high': 'bg-warning text-dark',
+        'urgent': 'bg-danger'
+    }
+    
     @property
     def status_badge_class(self):
         """Return Bootstrap badge class for status"""
-        status_classes = {
-            'open': 'bg-primary',
-            'in_progress': 'bg-warning text-dark',
-            'resolved': 'bg-success',
-            'closed': 'bg-secondary'
-        }
-        return status_classes.get(self.status, 'bg-secondary')
+        return self.STATUS_BADGE_CLASSES.get(self.status, 'bg-secondary')
     
     @property
     def priority_badge_class(self):
         """Return Bootstrap badge class for priority"""
-        priority_classes = {
-            'low': 'bg-light text-dark',
-            'medium': 'bg-info',
-            'high': 'bg-warning text-dark',
-            'urgent': 'bg-danger'
-        }
-        return priority_classes.get(self.priority, 'bg-info')
+        return self.PRIORITY_BADGE_CLASSES.get(self.priority, 'bg-info')
+    
+    # Detail page statements, built on first use and reused: include_internal -> select
+    _detail_stmts = {}
+    
+    @classmethod
+    def _detail_stmt(cls, include_internal):
+        stmt = cls._detail_stmts.get(include_internal)
+        if stmt is None:
+            stmt = select(cls).where(cls.id == bindparam('ticket_id')).options(
+                joinedload(cls.category),
+                joinedload(cls.creator),
+                joinedload(cls.assignee),
+                selectinload(cls.comments).joinedload(TicketComment.author),
+                selectinload(cls.attachments).joinedload(TicketAttachment.uploader),
+            )
+            if not include_internal:
+                stmt = stmt.options(with_loader_criteria(TicketComment, TicketComment.is_internal.isnot(True)))
+            cls._detail_stmts[include_internal] = stmt
+        return stmt
+    
+    @classmethod
+    def detail(cls, ticket_id, include_internal=True, options=()):
+        """Load a ticket with everything the detail page renders, or None.
+        
+        With include_internal=False, internal comments are filtered out in SQL.
+        Extra loader options (e.g. raiseload('*')) are appended to the query.
+        """
+        stmt = cls._detail_stmt(include_internal)
+        if options:
+            stmt = stmt.options(*options)
+        return db.session.execute(stmt, {'ticket_id': ticket_id}).unique().scalar_one_or_none()
+    
+    @classmethod
+    def adjust_votes(cls, ticket_id, up=0, down=0):
+        """Apply vote counter deltas in a single UPDATE so the database does the arithmetic.
+        
+        Returns the new (upvotes, downvotes), or None if the ticket does not exist.
+        """
+        result = db.session.execute(
+            update(cls)
+            .where(cls.id == ticket_id)
+            .values(upvotes=cls.upvotes + up, downvotes=cls.downvotes + down, score=cls.score + up - down)
+        )
+        if result.rowcount == 0:
+            return None
+        # Read back in the same transaction; MySQL has no UPDATE ... RETURNING
+        return db.session.execute(select(cls.upvotes, cls.downvotes).where(cls.id == ticket_id)).one()
+    
+    @classmethod
+    def votes_for_user(cls, ticket_ids, user_id):
+        """Get {ticket_id: vote_type} for a user's votes on several tickets in one query"""
+        if not ticket_ids:
+            return {}
+        rows = db.session.execute(
+            select(TicketVote.ticket_id, TicketVote.vote_type)
+            .where(TicketVote.user_id == user_id, TicketVote.ticket_id.in_(ticket_ids))
+        ).all()
+        return dict(rows)
+    
+    @classmethod
+    def search_condition(cls, text):
+        """WHERE clause matching tickets whose subject or description contains text"""
+        dialect = db.engine.dialect.name
+        if dialect == 'postgresql':
+            return _search_document(cls.subject, cls.description).op('@@')(db.func.plainto_tsquery('english', text))
+        if dialect == 'sqlite':
+            # Quoted as a phrase so user input is never parsed as FTS syntax; the last word matches as a prefix
+            phrase = '"' + text.replace('"', '""') + '"*'
+            return cls.id.in_(select(ticket_fts.c.rowid).where(ticket_fts.c.ticket_fts.op('MATCH')(phrase)))
+        search_term = f"%{text}%"
+        return db.or_(cls.subject.ilike(search_term), cls.description.ilike(search_term))
     
     def get_user_vote(self, user_id):
         """Get user's vote for this ticket"""
         return TicketVote.query.filter_by(ticket_id=self.id, user_id=user_id).first()
 
+event.listen(Ticket.__table__, 'after_create', lambda target, connection, **kw: create_search_index(connection))
+
 class TicketComment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     content = db.Column(db.Text, nullable=False)
@@ -121,8 +365,10 @@ class TicketComment(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     
     # Timestamps
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = db.Column(Timestamp, nullable=False, server_default=db.func.now())
+    updated_at = db.Column(Timestamp, nullable=False, server_default=db.func.now(), onupdate=db.func.now())
+    
+    __table_args__ = (db.Index('ix_comment_ticket_id_created', ticket_id, created_at),)
     
     def __repr__(self):
         return f'<TicketComment {self.id} for Ticket {self.ticket_id}>'
@@ -139,7 +385,7 @@ class TicketAttachment(db.Model):
     uploaded_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     
     # Timestamps
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(Timestamp, nullable=False, server_default=db.func.now())
     
     # Relationships
     uploader = db.relationship('User', backref='uploaded_files')
@@ -156,10 +402,24 @@ class TicketVote(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     
     # Timestamps
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(Timestamp, nullable=False, server_default=db.func.now())
     
     # Unique constraint to prevent duplicate votes
-    __table_args__ = (db.UniqueConstraint('ticket_id', 'user_id', name='unique_ticket_user_vote'),)
+    __table_args__ = (
+        db.UniqueConstraint('ticket_id', 'user_id', name='unique_ticket_user_vote'),
+        db.Index('ix_ticket_vote_user_id', 'user_id'),
+    )
     
     def __repr__(self):
         return f'<TicketVote {self.vote_type} by User {self.user_id} for Ticket {self.ticket_id}>'
+
+class BootstrapMarker(db.Model):
+    """Single-row table recording that the default data has been created"""
+    __tablename__ = 'bootstrap_marker'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    created_at = db.Column(Timestamp, nullable=False, server_default=db.func.now())
+
+# Set up the backref attributes (Ticket.creator, TicketComment.author, ...) now: the ticket
+# views and Ticket.detail name them in loader options, which fails if no query has run yet
+configure_mappers()
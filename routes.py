@@ -1,35 +1,104 @@
 import os
 import uuid
 from datetime import datetime
+from functools import wraps
 from flask import render_template, redirect, url_for, flash, request, abort, send_from_directory, jsonify, session
 from flask_login import login_user, logout_user, login_required, current_user
-from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.security import check_password_hash
 from werkzeug.utils import secure_filename
-from sqlalchemy import or_, desc, asc, func
-from sqlalchemy.orm import joinedload
+from sqlalchemy import or_, and_, desc, asc, func, case, delete, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload, load_only, raiseload
 
-from app import app, db
+from app import app, db, cache
 from models import User, Ticket, Category, TicketComment, TicketAttachment, TicketVote
 from forms import (LoginForm, RegisterForm, TicketForm, TicketUpdateForm, CommentForm, 
                   CategoryForm, UserEditForm, SearchForm, VoteForm)
-from utils import send_notification_email, allowed_file, get_file_size
+from utils import (queue_notification_email, get_admin_emails, allowed_file, save_upload, hash_password,
+                   password_needs_rehash, get_priority_color, get_status_color, get_user_role_display,
+                   truncate_text, ROLE_NAMES)
+
+# Role hierarchy: a role can act as (and access everything open to) any lower-ranked role
+_ROLE_RANK = {'admin': 3, 'agent': 2, 'user': 1}
+
+def require_role(min_role):
+    """Restrict a view to users ranked at least min_role (use below @login_required)"""
+    rank = _ROLE_RANK[min_role]
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            if not current_user.is_authenticated or _ROLE_RANK.get(current_user.role, 0) < rank:
+                abort(403)
+            return f(*args, **kwargs)
+        return wrapper
+    return decorator
 
 # Template helper functions
+for _helper in (get_priority_color, get_status_color, get_user_role_display):
+    app.add_template_global(_helper)
+# Also as filters, e.g. {{ ticket.priority|priority_color }}
+app.add_template_filter(get_priority_color, 'priority_color')
+app.add_template_filter(get_status_color, 'status_color')
+app.add_template_filter(get_user_role_display, 'role_display')
+app.add_template_filter(truncate_text)
+
+@cache.memoize(timeout=30)
+def count_tickets(user_id=None, status=None):
+    """Count tickets, optionally for one creator and/or status (cached briefly)"""
+    query = Ticket.query
+    if user_id is not None:
+        query = query.filter_by(user_id=user_id)
+    if status is not None:
+        query = query.filter_by(status=status)
+    return query.count()
+
+def _visible_ticket_owner():
+    """Creator filter for ticket counts: end users only count their own tickets"""
+    return current_user.id if current_user.role == 'user' else None
+
+# Rendered ticket pages are cached per user, session and query string; replacing the
+# generation token orphans every cached page at once after a ticket changes
+TICKET_PAGES_GENERATION = 'ticket_pages_generation'
+
+def _ticket_page_cache_key(name):
+    """Cache key for a rendered ticket page as the current user and session see it"""
+    generation = cache.get(TICKET_PAGES_GENERATION) or ''
+    return (f"{name}:{generation}:{current_user.id}:{current_user.role}:"
+            f"{session.get('login_as_role', '')}:{session.get('csrf_token', '')}:"
+            f"{request.query_string.decode()}")
+
+def _has_pending_flashes():
+    """Pages with flashed messages must be rendered so the messages are shown once"""
+    return '_flashes' in session
+
+# SimpleCache lives in each worker process, where changes made through another worker can't
+# expire it, so rendered pages are only cached with a shared backend such as RedisCache
+PAGE_CACHE_SHARED = app.config['CACHE_TYPE'].rsplit('.', 1)[-1].lower() not in (
+    'simplecache', 'simple', 'nullcache', 'null'
+)
+
+def _skip_page_cache():
+    """Render ticket pages afresh unless the cache is shared and no messages are waiting"""
+    return not PAGE_CACHE_SHARED or _has_pending_flashes()
+
+def _expire_ticket_pages():
+    """Drop all cached ticket list and dashboard pages"""
+    cache.set(TICKET_PAGES_GENERATION, uuid.uuid4().hex, timeout=0)
+
 @app.template_global()
 def get_ticket_count():
     """Get ticket count for current user"""
     if current_user.is_authenticated:
-        if current_user.role == 'user':
-            return Ticket.query.filter_by(user_id=current_user.id, status='open').count()
-        else:
-            return Ticket.query.filter_by(status='open').count()
+        return count_tickets(_visible_ticket_owner(), 'open')
     return 0
 
 @app.template_filter('format_datetime')
+@app.template_global('format_datetime')
 def format_datetime(dt):
     """Format datetime for display"""
+    # Fixed ASCII format, so skip strftime's locale handling
     if dt:
-        return dt.strftime('%Y-%m-%d %H:%M')
+        return f"{dt.year:04d}-{dt.month:02d}-{dt.day:02d} {dt.hour:02d}:{dt.minute:02d}"
     return ''
 
 @app.template_global()
@@ -62,27 +131,32 @@ def login():
     form = LoginForm()
     if form.validate_on_submit():
         # Allow login with username or email
+        # Fold case in SQL on both sides so it matches the lower() unique indexes exactly
+        login_name = func.lower(form.username.data)
         user = User.query.filter(
-            or_(User.username == form.username.data, User.email == form.username.data)
+            or_(func.lower(User.username) == login_name, func.lower(User.email) == login_name)
         ).first()
         
         if user and check_password_hash(user.password_hash, form.password.data):
+            # Upgrade hashes made with older, slower settings now that we have the password
+            if password_needs_rehash(user.password_hash):
+                user.password_hash = hash_password(form.password.data)
+                db.session.commit()
+            
             if user.is_active:
                 # Check if user has the required role permissions
                 selected_role = form.role.data
                 user_role = user.role
                 
                 # Role hierarchy check: admin can access any role, agent can access agent/user, user can only access user
-                role_hierarchy = {'admin': 3, 'agent': 2, 'user': 1}
-                
-                if role_hierarchy.get(user_role, 0) >= role_hierarchy.get(selected_role, 0):
+                if _ROLE_RANK.get(user_role, 0) >= _ROLE_RANK.get(selected_role, 0):
                     login_user(user, remember=form.remember_me.data)
                     
                     # Store the selected role in session for UI purposes
                     session['login_as_role'] = selected_role
                     
                     next_page = request.args.get('next')
-                    role_name = {'admin': 'Administrator', 'agent': 'Support Agent', 'user': 'End User'}[selected_role]
+                    role_name = ROLE_NAMES[selected_role]
                     flash(f'Welcome back, {user.full_name}! Logged in as {role_name}.', 'success')
                     return redirect(next_page) if next_page else redirect(url_for('dashboard'))
                 else:
@@ -94,6 +168,22 @@ def login():
     
     return render_template('auth/login.html', form=form)
 
+def _user_conflict(username, email, exclude_id=None):
+    """Return 'username' or 'email' if another user already has it, checked in one query"""
+    # Case is folded by the database on both sides, as in the lower() unique indexes
+    username_taken = func.lower(User.username) == func.lower(username)
+    email_taken = func.lower(User.email) == func.lower(email)
+    query = db.session.query(username_taken).filter(or_(username_taken, email_taken))
+    if exclude_id is not None:
+        query = query.filter(User.id != exclude_id)
+    
+    conflicts = query.limit(2).all()
+    if any(row[0] for row in conflicts):
+        return 'username'
+    if conflicts:
+        return 'email'
+    return None
+
 @app.route('/register', methods=['GET', 'POST'])
 def register():
     if current_user.is_authenticated:
@@ -102,11 +192,12 @@ def register():
     form = RegisterForm()
     if form.validate_on_submit():
         # Check if username or email already exists
-        if User.query.filter_by(username=form.username.data).first():
+        conflict = _user_conflict(form.username.data, form.email.data)
+        if conflict == 'username':
             flash('Username already exists.', 'error')
             return render_template('auth/register.html', form=form)
         
-        if User.query.filter_by(email=form.email.data).first():
+        if conflict == 'email':
             flash('Email already registered.', 'error')
             return render_template('auth/register.html', form=form)
         
@@ -116,7 +207,7 @@ def register():
             email=form.email.data,
             first_name=form.first_name.data,
             last_name=form.last_name.data,
-            password_hash=generate_password_hash(form.password.data),
+            password_hash=hash_password(form.password.data),
             role='user'  # Default role
         )
         
@@ -137,6 +228,22 @@ def logout():
     flash('You have been logged out.', 'info')
     return redirect(url_for('index'))
 
+def _lazy_load_guard():
+    """Loader options that make un-eager-loaded relationships raise in debug mode"""
+    return [raiseload('*')] if app.debug else []
+
+# Ticket columns the dashboard's recent tickets and the ticket list render (the list also
+# needs created_at for its pagination cursor); descriptions and other columns are skipped
+RECENT_TICKET_COLUMNS = (Ticket.id, Ticket.subject, Ticket.status, Ticket.priority, Ticket.updated_at, Ticket.user_id)
+LIST_TICKET_COLUMNS = RECENT_TICKET_COLUMNS + (
+    Ticket.created_at, Ticket.assigned_to, Ticket.category_id,
+    Ticket.upvotes, Ticket.downvotes, Ticket.comment_count,
+)
+
+def _count_where(condition):
+    """Aggregate counting the rows that match condition (0 for an empty set)"""
+    return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
 # Main routes
 @app.route('/')
 def index():
@@ -146,77 +253,166 @@ def index():
 
 @app.route('/dashboard')
 @login_required
+@cache.cached(timeout=15, key_prefix=lambda: _ticket_page_cache_key('dashboard'), unless=_skip_page_cache)
 def dashboard():
-    # Get user statistics
+    # Recent tickets only load the columns the table shows; in debug mode other columns raise
+    recent_options = (
+        load_only(*RECENT_TICKET_COLUMNS, raiseload=app.debug),
+        joinedload(Ticket.creator).load_only(User.full_name),
+        *_lazy_load_guard()
+    )
+    
+    # Get user statistics in a single aggregate query
     if current_user.role == 'user':
         # End user dashboard
-        my_tickets = Ticket.query.filter_by(user_id=current_user.id)
-        stats = {
-            'total_tickets': my_tickets.count(),
-            'open_tickets': my_tickets.filter_by(status='open').count(),
-            'in_progress_tickets': my_tickets.filter_by(status='in_progress').count(),
-            'resolved_tickets': my_tickets.filter_by(status='resolved').count()
-        }
-        recent_tickets = my_tickets.order_by(desc(Ticket.updated_at)).limit(5).all()
+        stats = db.session.query(
+            func.count(Ticket.id).label('total_tickets'),
+            _count_where(Ticket.status == 'open').label('open_tickets'),
+            _count_where(Ticket.status == 'in_progress').label('in_progress_tickets'),
+            _count_where(Ticket.status == 'resolved').label('resolved_tickets')
+        ).filter(Ticket.user_id == current_user.id).one()._asdict()
+        recent_tickets = Ticket.query.options(*recent_options).filter_by(user_id=current_user.id).order_by(desc(Ticket.updated_at)).limit(5).all()
     else:
         # Agent/Admin dashboard
-        all_tickets = Ticket.query
         if current_user.role == 'agent':
             # Agents see all tickets but with focus on assigned ones
-            assigned_tickets = all_tickets.filter_by(assigned_to=current_user.id)
+            assigned = Ticket.assigned_to == current_user.id
         else:
-            assigned_tickets = all_tickets
+            assigned = Ticket.assigned_to.isnot(None)
         
-        stats = {
-            'total_tickets': all_tickets.count(),
-            'open_tickets': all_tickets.filter_by(status='open').count(),
-            'in_progress_tickets': all_tickets.filter_by(status='in_progress').count(),
-            'my_assigned': assigned_tickets.count() if current_user.role == 'agent' else all_tickets.filter(Ticket.assigned_to.isnot(None)).count()
-        }
-        recent_tickets = all_tickets.order_by(desc(Ticket.updated_at)).limit(10).all()
+        stats = db.session.query(
+            func.count(Ticket.id).label('total_tickets'),
+            _count_where(Ticket.status == 'open').label('open_tickets'),
+            _count_where(Ticket.status == 'in_progress').label('in_progress_tickets'),
+            _count_where(assigned).label('my_assigned')
+        ).one()._asdict()
+        recent_tickets = Ticket.query.options(*recent_options).order_by(desc(Ticket.updated_at)).limit(10).all()
     
     return render_template('dashboard.html', stats=stats, recent_tickets=recent_tickets)
 
+TICKETS_PER_PAGE = 20
+
+# Sort orders paginated by seeking past the last row: sort_by -> (column, descending)
+KEYSET_SORTS = {
+    'created_desc': (Ticket.created_at, True),
+    'created_asc': (Ticket.created_at, False),
+    'updated_desc': (Ticket.updated_at, True),
+    'updated_asc': (Ticket.updated_at, False),
+}
+
+# Sort orders paginated by page number: sort_by -> ORDER BY clauses
+OFFSET_SORTS = {
+    'votes_desc': (desc(Ticket.score), desc(Ticket.id)),
+    'comments_desc': (desc(Ticket.comment_count), desc(Ticket.id)),
+}
+
+class TicketPage:
+    """One page of tickets plus the query arguments for its neighbours (None if there is none)"""
+    def __init__(self, items, prev_args=None, next_args=None):
+        self.items = items
+        self.prev_args = prev_args
+        self.next_args = next_args
+
+def _encode_cursor(ticket, column):
+    return f"{getattr(ticket, column.key).isoformat()}_{ticket.id}"
+
+def _decode_cursor(cursor):
+    """Parse a '<timestamp>_<id>' cursor, returning None if it is malformed"""
+    value, _, ticket_id = (cursor or '').rpartition('_')
+    try:
+        value, ticket_id = datetime.fromisoformat(value), int(ticket_id)
+    except ValueError:
+        return None
+    # Ids outside the 64-bit range would overflow when bound as a query parameter
+    if not -2**63 <= ticket_id < 2**63:
+        return None
+    return value, ticket_id
+
+def _keyset_page(query, column, descending, link_args, after=None, before=None):
+    """Fetch the page after (or before) a cursor by seeking on (column, id)"""
+    cursor = _decode_cursor(before or after)
+    backwards = cursor is not None and bool(before)
+    # Walking back to the previous page flips both the comparison and the order
+    seek_desc = descending != backwards
+    if cursor is not None:
+        value, ticket_id = cursor
+        if seek_desc:
+            query = query.filter(or_(column < value, and_(column == value, Ticket.id < ticket_id)))
+        else:
+            query = query.filter(or_(column > value, and_(column == value, Ticket.id > ticket_id)))
+    order = (desc(column), desc(Ticket.id)) if seek_desc else (asc(column), asc(Ticket.id))
+    rows = query.order_by(*order).limit(TICKETS_PER_PAGE + 1).all()
+    has_more = len(rows) > TICKETS_PER_PAGE
+    rows = rows[:TICKETS_PER_PAGE]
+    if backwards:
+        rows.reverse()
+        has_prev, has_next = has_more, True
+    else:
+        has_prev, has_next = cursor is not None, has_more
+    
+    page = TicketPage(rows)
+    if rows and has_prev:
+        page.prev_args = dict(link_args, before=_encode_cursor(rows[0], column))
+    if rows and has_next:
+        page.next_args = dict(link_args, after=_encode_cursor(rows[-1], column))
+    return page
+
+def _offset_page(query, page_num, link_args):
+    """Fetch a page by offset, reading one extra row instead of counting"""
+    page_num = max(page_num, 1)
+    rows = query.limit(TICKETS_PER_PAGE + 1).offset((page_num - 1) * TICKETS_PER_PAGE).all()
+    page = TicketPage(rows[:TICKETS_PER_PAGE])
+    if page_num > 1:
+        page.prev_args = dict(link_args, page=page_num - 1)
+    if len(rows) > TICKETS_PER_PAGE:
+        page.next_args = dict(link_args, page=page_num + 1)
+    return page
+
 @app.route('/tickets')
 @login_required
+@cache.cached(timeout=30, key_prefix=lambda: _ticket_page_cache_key('tickets'), unless=_skip_page_cache)
 def tickets_list():
     form = SearchForm()
     
-    # Base query
+    # Base query, loading only the columns the table and quick-edit forms use
     query = Ticket.query.options(
-        joinedload(Ticket.creator),
-        joinedload(Ticket.category),
-        joinedload(Ticket.assignee)
+        load_only(*LIST_TICKET_COLUMNS, raiseload=app.debug),
+        joinedload(Ticket.creator).load_only(User.full_name, User.email),
+        joinedload(Ticket.category).load_only(Category.name),
+        joinedload(Ticket.assignee).load_only(User.full_name),
+        *_lazy_load_guard()
     )
     
+    # Read each argument once; malformed ids parse as 0 instead of raising
+    args = request.args
+    search = args.get('query')
+    status = args.get('status')
+    category_id = args.get('category_id', 0, type=int)
+    priority = args.get('priority')
+    assigned_to = args.get('assigned_to', 0, type=int)
+    
     # Apply filters based on form data
-    if request.args.get('query'):
-        search_term = f"%{request.args.get('query')}%"
-        query = query.filter(
-            or_(
-                Ticket.subject.ilike(search_term),
-                Ticket.description.ilike(search_term)
-            )
-        )
-        form.query.data = request.args.get('query')
+    if search:
+        query = query.filter(Ticket.search_condition(search))
+        form.query.data = search
     
-    if request.args.get('status'):
-        query = query.filter(Ticket.status == request.args.get('status'))
-        form.status.data = request.args.get('status')
+    if status:
+        query = query.filter(Ticket.status == status)
+        form.status.data = status
     
-    if request.args.get('category_id') and int(request.args.get('category_id')) > 0:
-        query = query.filter(Ticket.category_id == int(request.args.get('category_id')))
-        form.category_id.data = int(request.args.get('category_id'))
+    if category_id > 0:
+        query = query.filter(Ticket.category_id == category_id)
+        form.category_id.data = category_id
     
-    if request.args.get('priority'):
-        query = query.filter(Ticket.priority == request.args.get('priority'))
-        form.priority.data = request.args.get('priority')
+    if priority:
+        query = query.filter(Ticket.priority == priority)
+        form.priority.data = priority
     
-    if request.args.get('assigned_to') and int(request.args.get('assigned_to')) > 0:
-        query = query.filter(Ticket.assigned_to == int(request.args.get('assigned_to')))
-        form.assigned_to.data = int(request.args.get('assigned_to'))
+    if assigned_to > 0:
+        query = query.filter(Ticket.assigned_to == assigned_to)
+        form.assigned_to.data = assigned_to
     
-    if request.args.get('my_tickets') == 'y':
+    if args.get('my_tickets') == 'y':
         if current_user.role == 'user':
             query = query.filter(Ticket.user_id == current_user.id)
         else:
@@ -226,28 +422,24 @@ def tickets_list():
         # Regular users only see their own tickets by default
         query = query.filter(Ticket.user_id == current_user.id)
     
-    # Apply sorting
-    sort_by = request.args.get('sort_by', 'created_desc')
+    # Apply sorting and pagination; no COUNT query, just previous/next links
+    sort_by = args.get('sort_by', 'created_desc')
+    if sort_by not in KEYSET_SORTS and sort_by not in OFFSET_SORTS:
+        sort_by = 'created_desc'
     form.sort_by.data = sort_by
+    link_args = {k: v for k, v in args.items() if k not in ('page', 'after', 'before')}
     
-    if sort_by == 'created_asc':
-        query = query.order_by(asc(Ticket.created_at))
-    elif sort_by == 'updated_desc':
-        query = query.order_by(desc(Ticket.updated_at))
-    elif sort_by == 'updated_asc':
-        query = query.order_by(asc(Ticket.updated_at))
-    elif sort_by == 'votes_desc':
-        query = query.order_by(desc(Ticket.upvotes - Ticket.downvotes))
-    elif sort_by == 'comments_desc':
-        query = query.outerjoin(TicketComment).group_by(Ticket.id).order_by(desc(func.count(TicketComment.id)))
-    else:  # created_desc (default)
-        query = query.order_by(desc(Ticket.created_at))
-    
-    # Pagination
-    page = request.args.get('page', 1, type=int)
-    tickets = query.paginate(page=page, per_page=20, error_out=False)
-    
-    return render_template('tickets/list.html', tickets=tickets, form=form)
+    if sort_by in KEYSET_SORTS:
+        column, descending = KEYSET_SORTS[sort_by]
+        tickets = _keyset_page(query, column, descending, link_args,
+                               after=args.get('after'), before=args.get('before'))
+    else:
+        tickets = _offset_page(query.order_by(*OFFSET_SORTS[sort_by]), args.get('page', 1, type=int), link_args)
+    
+    # Current user's votes for the whole page in one query
+    user_votes = Ticket.votes_for_user([t.id for t in tickets.items], current_user.id)
+    
+    return render_template('tickets/list.html', tickets=tickets, form=form, user_votes=user_votes)
 
 @app.route('/tickets/create', methods=['GET', 'POST'])
 @login_required
@@ -273,23 +465,28 @@ def create_ticket():
                 # Add UUID to prevent filename conflicts
                 unique_filename = f"{uuid.uuid4().hex}_{filename}"
                 file_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-                file.save(file_path)
+                # Count the size while writing instead of stat-ing the file afterwards
+                file_size = save_upload(file, file_path, app.config['MAX_CONTENT_LENGTH'])
+                if file_size is None:
+                    abort(413)
                 
                 # Create attachment record
                 attachment = TicketAttachment()
                 attachment.filename = unique_filename
                 attachment.original_filename = filename
-                attachment.file_size = get_file_size(file_path)
+                attachment.file_size = file_size
                 attachment.mime_type = file.content_type or 'application/octet-stream'
                 attachment.ticket_id = ticket.id
                 attachment.uploaded_by = current_user.id
                 db.session.add(attachment)
         
         db.session.commit()
+        cache.delete_memoized(count_tickets)
+        _expire_ticket_pages()
         
         # Send notification email (mocked for MVP)
-        send_notification_email(
-            ticket,
+        queue_notification_email(
+            ticket.id,
             'new_ticket',
             f'New ticket created: {ticket.subject}'
         )
@@ -302,18 +499,16 @@ def create_ticket():
 @app.route('/tickets/<int:id>')
 @login_required
 def view_ticket(id):
-    ticket = Ticket.query.get_or_404(id)
+    # Internal comments are filtered out by the query for regular users
+    ticket = Ticket.detail(id, include_internal=current_user.role != 'user', options=_lazy_load_guard())
+    if ticket is None:
+        abort(404)
     
     # Check permissions
     if current_user.role == 'user' and ticket.user_id != current_user.id:
         abort(403)
     
-    # Get comments (filter internal comments for regular users)
-    all_comments = list(ticket.comments)
-    if current_user.role == 'user':
-        comments = [c for c in all_comments if not c.is_internal]
-    else:
-        comments = all_comments
+    comments = ticket.comments
     
     # Forms for actions
     update_form = TicketUpdateForm(obj=ticket)
@@ -334,38 +529,42 @@ def view_ticket(id):
 @app.route('/tickets/<int:id>/update', methods=['POST'])
 @login_required
 def update_ticket(id):
-    ticket = Ticket.query.get_or_404(id)
-    
-    # Check permissions
-    if not current_user.can_edit_ticket(ticket):
-        abort(403)
-    
     form = TicketUpdateForm()
     if form.validate_on_submit():
-        # Track status changes
-        old_status = ticket.status
+        new_status = form.status.data
+        values = []
         
-        ticket.status = form.status.data
-        ticket.priority = form.priority.data
+        # Update timestamps based on status changes, comparing against the stored status in SQL.
+        # They are set before status: MySQL applies SET assignments left to right
+        if new_status == 'resolved':
+            values.append((Ticket.resolved_at, case((Ticket.status != new_status, func.now()), else_=Ticket.resolved_at)))
+        elif new_status == 'closed':
+            values.append((Ticket.closed_at, case((Ticket.status != new_status, func.now()), else_=Ticket.closed_at)))
+        values += [(Ticket.status, new_status), (Ticket.priority, form.priority.data)]
         
         # Only agents/admins can assign tickets
         if current_user.can_assign_tickets():
-            ticket.assigned_to = form.assigned_to.data if form.assigned_to.data > 0 else None
+            values.append((Ticket.assigned_to, form.assigned_to.data if form.assigned_to.data > 0 else None))
         
-        # Update timestamps based on status changes
-        if old_status != ticket.status:
-            if ticket.status == 'resolved':
-                ticket.resolved_at = datetime.utcnow()
-            elif ticket.status == 'closed':
-                ticket.closed_at = datetime.utcnow()
+        # Check permissions in the same statement: end users can only edit their own tickets
+        stmt = update(Ticket).where(Ticket.id == id)
+        if current_user.role == 'user':
+            stmt = stmt.where(Ticket.user_id == current_user.id)
+        if db.session.execute(stmt.ordered_values(*values)).rowcount == 0:
+            db.session.rollback()
+            abort(403 if db.session.get(Ticket, id) else 404)
+        # Read the subject in the same transaction; MySQL has no UPDATE ... RETURNING
+        subject = db.session.query(Ticket.subject).filter(Ticket.id == id).scalar()
         
         db.session.commit()
+        cache.delete_memoized(count_tickets)
+        _expire_ticket_pages()
         
         # Send notification email
-        send_notification_email(
-            ticket,
+        queue_notification_email(
+            id,
             'ticket_updated',
-            f'Ticket updated: {ticket.subject}'
+            f'Ticket updated: {subject}'
         )
         
         flash('Ticket updated successfully!', 'success')
@@ -392,12 +591,14 @@ def add_comment(id):
         comment.user_id = current_user.id
         
         db.session.add(comment)
-        ticket.updated_at = datetime.utcnow()
+        ticket.comment_count = Ticket.comment_count + 1
+        ticket.updated_at = db.func.now()
         db.session.commit()
+        _expire_ticket_pages()
         
         # Send notification email
-        send_notification_email(
-            ticket,
+        queue_notification_email(
+            ticket.id,
             'comment_added',
             f'New comment on ticket: {ticket.subject}'
         )
@@ -411,32 +612,21 @@ def add_comment(id):
 @app.route('/tickets/<int:id>/vote', methods=['POST'])
 @login_required
 def vote_ticket(id):
-    ticket = Ticket.query.get_or_404(id)
     vote_type = request.form.get('vote_type')
     
     if vote_type not in ['up', 'down']:
         abort(400)
     
-    # Check if user already voted
-    existing_vote = TicketVote.query.filter_by(ticket_id=id, user_id=current_user.id).first()
-    
-    if existing_vote:
-        if existing_vote.vote_type == vote_type:
-            # Remove vote if clicking same vote type
-            if vote_type == 'up':
-                ticket.upvotes -= 1
-            else:
-                ticket.downvotes -= 1
-            db.session.delete(existing_vote)
-        else:
-            # Change vote type
-            if existing_vote.vote_type == 'up':
-                ticket.upvotes -= 1
-                ticket.downvotes += 1
-            else:
-                ticket.downvotes -= 1
-                ticket.upvotes += 1
-            existing_vote.vote_type = vote_type
+    # Apply the vote with conditional statements instead of reading the existing vote first
+    own_vote = (TicketVote.ticket_id == id, TicketVote.user_id == current_user.id)
+    user_vote = vote_type
+    if db.session.execute(delete(TicketVote).where(*own_vote, TicketVote.vote_type == vote_type)).rowcount:
+        # Remove vote if clicking same vote type
+        change, opposite_change = -1, 0
+        user_vote = None
+    elif db.session.execute(update(TicketVote).where(*own_vote).values(vote_type=vote_type)).rowcount:
+        # Change vote type
+        change, opposite_change = 1, -1
     else:
         # Create new vote
         vote = TicketVote()
@@ -444,18 +634,30 @@ def vote_ticket(id):
         vote.user_id = current_user.id
         vote.vote_type = vote_type
         db.session.add(vote)
-        if vote_type == 'up':
-            ticket.upvotes += 1
-        else:
-            ticket.downvotes += 1
+        try:
+            db.session.flush()
+        except IntegrityError:
+            # A concurrent request already recorded this user's vote (or the ticket is gone)
+            db.session.rollback()
+            return redirect(url_for('view_ticket', id=id))
+        change, opposite_change = 1, 0
+    
+    if vote_type == 'up':
+        counts = Ticket.adjust_votes(id, up=change, down=opposite_change)
+    else:
+        counts = Ticket.adjust_votes(id, up=opposite_change, down=change)
+    if counts is None:
+        db.session.rollback()
+        abort(404)
     
     db.session.commit()
+    _expire_ticket_pages()
     
     if request.is_json:
         return jsonify({
-            'upvotes': ticket.upvotes,
-            'downvotes': ticket.downvotes,
-            'user_vote': vote_type if not (existing_vote and existing_vote.vote_type == vote_type) else None
+            'upvotes': counts.upvotes,
+            'downvotes': counts.downvotes,
+            'user_vote': user_vote
         })
     
     return redirect(url_for('view_ticket', id=id))
@@ -470,6 +672,15 @@ def download_file(attachment_id):
     if current_user.role == 'user' and ticket.user_id != current_user.id:
         abort(403)
     
+    accel_prefix = app.config['X_ACCEL_REDIRECT_PREFIX']
+    if accel_prefix:
+        # nginx serves the file from its internal location; the worker only sends headers
+        response = app.response_class(mimetype=attachment.mime_type)
+        response.headers['X-Accel-Redirect'] = f"{accel_prefix.rstrip('/')}/{attachment.filename}"
+        response.headers.set('Content-Disposition', 'attachment', filename=attachment.original_filename)
+        return response
+    
+    # With USE_X_SENDFILE set this also only sends headers
     return send_from_directory(app.config['UPLOAD_FOLDER'], 
                              attachment.filename, 
                              as_attachment=True,
@@ -478,19 +689,15 @@ def download_file(attachment_id):
 # Admin routes
 @app.route('/admin/categories')
 @login_required
+@require_role('admin')
 def admin_categories():
-    if current_user.role != 'admin':
-        abort(403)
-    
     categories = Category.query.all()
     return render_template('admin/categories.html', categories=categories)
 
 @app.route('/admin/categories/create', methods=['GET', 'POST'])
 @login_required
+@require_role('admin')
 def create_category():
-    if current_user.role != 'admin':
-        abort(403)
-    
     form = CategoryForm()
     if form.validate_on_submit():
         # Check if category name already exists
@@ -505,6 +712,7 @@ def create_category():
         
         db.session.add(category)
         db.session.commit()
+        _expire_ticket_pages()
         
         flash('Category created successfully!', 'success')
         return redirect(url_for('admin_categories'))
@@ -514,64 +722,70 @@ def create_category():
 
 @app.route('/admin/categories/<int:id>/edit', methods=['POST'])
 @login_required
+@require_role('admin')
 def edit_category(id):
-    if current_user.role != 'admin':
-        abort(403)
-    
-    category = Category.query.get_or_404(id)
     form = CategoryForm()
     
     if form.validate_on_submit():
-        # Check if new name conflicts with existing category
-        existing = Category.query.filter(Category.name == form.name.data, Category.id != id).first()
-        if existing:
+        # The unique name constraint reports conflicts, so no lookup is needed first
+        try:
+            updated = db.session.execute(
+                update(Category).where(Category.id == id).values(
+                    name=form.name.data,
+                    description=form.description.data,
+                    is_active=form.is_active.data
+                )
+            ).rowcount
+        except IntegrityError:
+            db.session.rollback()
             flash('Category name already exists.', 'error')
         else:
-            category.name = form.name.data
-            category.description = form.description.data
-            category.is_active = form.is_active.data
-            
+            if not updated:
+                abort(404)
             db.session.commit()
+            _expire_ticket_pages()
             flash('Category updated successfully!', 'success')
     
     return redirect(url_for('admin_categories'))
 
 @app.route('/admin/users')
 @login_required
+@require_role('admin')
 def admin_users():
-    if current_user.role != 'admin':
-        abort(403)
-    
     users = User.query.all()
     return render_template('admin/users.html', users=users)
 
 @app.route('/admin/users/<int:id>/edit', methods=['POST'])
 @login_required
+@require_role('admin')
 def edit_user(id):
-    if current_user.role != 'admin':
-        abort(403)
-    
-    user = User.query.get_or_404(id)
     form = UserEditForm()
     
     if form.validate_on_submit():
         # Check for username/email conflicts
-        username_conflict = User.query.filter(User.username == form.username.data, User.id != id).first()
-        email_conflict = User.query.filter(User.email == form.email.data, User.id != id).first()
+        conflict = _user_conflict(form.username.data, form.email.data, exclude_id=id)
         
-        if username_conflict:
+        if conflict == 'username':
             flash('Username already exists.', 'error')
-        elif email_conflict:
+        elif conflict == 'email':
             flash('Email already exists.', 'error')
         else:
-            user.username = form.username.data
-            user.email = form.email.data
-            user.first_name = form.first_name.data
-            user.last_name = form.last_name.data
-            user.role = form.role.data
-            user.is_active = form.is_active.data
+            updated = db.session.execute(
+                update(User).where(User.id == id).values(
+                    username=form.username.data,
+                    email=form.email.data,
+                    first_name=form.first_name.data,
+                    last_name=form.last_name.data,
+                    role=form.role.data,
+                    is_active=form.is_active.data
+                )
+            ).rowcount
+            if not updated:
+                abort(404)
             
             db.session.commit()
+            _expire_ticket_pages()
+            cache.delete_memoized(get_admin_emails)
             flash('User updated successfully!', 'success')
     
     return redirect(url_for('admin_users'))
@@ -597,17 +811,9 @@ def inject_user():
 
 @app.context_processor
 def utility_processor():
-    def format_datetime(dt):
-        if dt:
-            return dt.strftime('%Y-%m-%d %H:%M')
-        return ''
-    
     def get_ticket_count():
         if current_user.is_authenticated:
-            if current_user.role == 'user':
-                return Ticket.query.filter_by(user_id=current_user.id).count()
-            else:
-                return Ticket.query.count()
+            return count_tickets(_visible_ticket_owner())
         return 0
     
-    return dict(format_datetime=format_datetime, get_ticket_count=get_ticket_count)
+    return dict(get_ticket_count=get_ticket_count)
@@ -8,70 +8,76 @@ import os
 import sys
 sys.path.append('.')
 
-from app import app, db
+from app import app, db, cache, bootstrap_database
 from models import User
-from werkzeug.security import generate_password_hash
+from sqlalchemy import func, insert, or_
+from utils import get_admin_emails, hash_password
 
-def create_admin_user():
-    """Create an admin user"""
+# Default accounts: user columns plus the plain-text password printed for testing
+ADMIN_USER = {
+    'username': 'admin',
+    'email': 'admin@quickdesk.com',
+    'password': 'admin123',
+    'role': 'admin',
+    'first_name': 'Admin',
+    'last_name': 'User'
+}
+AGENT_USER = {
+    'username': 'agent',
+    'email': 'agent@quickdesk.com',
+    'password': 'agent123',
+    'role': 'agent',
+    'first_name': 'Support',
+    'last_name': 'Agent'
+}
+
+def seed_users(specs):
+    """Create the users that don't exist yet in one query, one insert and one commit"""
     with app.app_context():
-        # Check if admin already exists
-        admin = User.query.filter_by(email='admin@quickdesk.com').first()
-        if admin:
-            print("Admin user already exists!")
-            print(f"Email: admin@quickdesk.com")
-            print(f"Current role: {admin.role}")
-            return admin
+        # Check which users already exist; case is folded in SQL, as in the lower() unique index
+        matches = [func.lower(User.email) == func.lower(spec['email']) for spec in specs]
+        existing = {}
+        for role, *matched in db.session.query(User.role, *matches).filter(or_(*matches)).all():
+            for spec, is_match in zip(specs, matched):
+                if is_match:
+                    existing[spec['email']] = role
         
-        # Create new admin user
-        admin = User(
-            username='admin',
-            email='admin@quickdesk.com',
-            password_hash=generate_password_hash('admin123'),
-            role='admin',
-            first_name='Admin',
-            last_name='User'
-        )
+        new_users = []
+        for spec in specs:
+            label = spec['role'].title()
+            role = existing.get(spec['email'])
+            if role is not None:
+                print(f"{label} user already exists!")
+                print(f"Email: {spec['email']}")
+                print(f"Current role: {role}")
+            else:
+                user = {key: value for key, value in spec.items() if key != 'password'}
+                user['password_hash'] = hash_password(spec['password'])
+                new_users.append(user)
         
-        db.session.add(admin)
-        db.session.commit()
-        print("✓ Admin user created successfully!")
-        print(f"Email: admin@quickdesk.com")
-        print(f"Password: admin123")
-        return admin
+        if new_users:
+            db.session.execute(insert(User), new_users)
+            db.session.commit()
+            cache.delete_memoized(get_admin_emails)
+        
+        for spec in specs:
+            if spec['email'] not in existing:
+                print(f"✓ {spec['role'].title()} user created successfully!")
+                print(f"Email: {spec['email']}")
+                print(f"Password: {spec['password']}")
+
+def create_admin_user():
+    """Create an admin user"""
+    seed_users([ADMIN_USER])
 
 def create_agent_user():
     """Create an agent user"""
-    with app.app_context():
-        # Check if agent already exists
-        agent = User.query.filter_by(email='agent@quickdesk.com').first()
-        if agent:
-            print("Agent user already exists!")
-            print(f"Email: agent@quickdesk.com")
-            print(f"Current role: {agent.role}")
-            return agent
-        
-        # Create new agent user
-        agent = User(
-            username='agent',
-            email='agent@quickdesk.com',
-            password_hash=generate_password_hash('agent123'),
-            role='agent',
-            first_name='Support',
-            last_name='Agent'
-        )
-        
-        db.session.add(agent)
-        db.session.commit()
-        print("✓ Agent user created successfully!")
-        print(f"Email: agent@quickdesk.com")
-        print(f"Password: agent123")
-        return agent
+    seed_users([AGENT_USER])
 
 def promote_user_to_role(email, new_role):
     """Promote an existing user to a new role"""
     with app.app_context():
-        user = User.query.filter_by(email=email).first()
+        user = User.query.filter(func.lower(User.email) == func.lower(email)).first()
         if not user:
             print(f"❌ User with email {email} not found!")
             return None
@@ -79,25 +85,31 @@ def promote_user_to_role(email, new_role):
         old_role = user.role
         user.role = new_role
         db.session.commit()
+        cache.delete_memoized(get_admin_emails)
         print(f"✓ User {email} promoted from {old_role} to {new_role}")
         return user
 
 def list_all_users():
     """List all users and their roles"""
     with app.app_context():
-        users = User.query.all()
+        # Plain rows; no need to build User objects just to print them
+        users = db.session.query(User.id, User.email, User.role, User.first_name, User.last_name).all()
         if not users:
             print("No users found in the database.")
             return
         
         print("\n=== All Users ===")
-        for user in users:
-            print(f"ID: {user.id} | Email: {user.email} | Role: {user.role} | Name: {user.first_name} {user.last_name}")
+        for user_id, email, role, first_name, last_name in users:
+            print(f"ID: {user_id} | Email: {email} | Role: {role} | Name: {first_name} {last_name}")
 
 if __name__ == "__main__":
     print("QuickDesk Role Setup")
     print("===================")
     
+    # Make sure the tables exist before touching users
+    with app.app_context():
+        bootstrap_database()
+    
     if len(sys.argv) > 1:
         command = sys.argv[1]
         
@@ -106,9 +118,7 @@ if __name__ == "__main__":
         elif command == "create-agent":
             create_agent_user()
         elif command == "create-both":
-            create_admin_user()
-            print()
-            create_agent_user()
+            seed_users([ADMIN_USER, AGENT_USER])
         elif command == "list-users":
             list_all_users()
         elif command == "promote" and len(sys.argv) == 4:
@@ -142,9 +152,7 @@ if __name__ == "__main__":
         elif choice == "2":
             create_agent_user()
         elif choice == "3":
-            create_admin_user()
-            print()
-            create_agent_user()
+            seed_users([ADMIN_USER, AGENT_USER])
         elif choice == "4":
             list_all_users()
         elif choice == "5":
@@ -0,0 +1,56 @@
+import os
+import unittest
+from datetime import datetime
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from app import app, db, bootstrap_database
+import routes
+from models import Category, Ticket, User
+
+app.config["WTF_CSRF_ENABLED"] = False
+
+class TicketUpdateTest(unittest.TestCase):
+    """Status changes made through the update view"""
+    
+    def setUp(self):
+        with app.app_context():
+            bootstrap_database()
+            admin = User.query.filter_by(username="admin").one()
+            ticket = Ticket(subject="Printer", description="Out of paper", user_id=admin.id,
+                            category_id=Category.query.first().id)
+            db.session.add(ticket)
+            db.session.commit()
+            self.ticket_id = ticket.id
+        self.client = app.test_client()
+        self.client.post("/login", data={"username": "admin", "password": "admin123"})
+    
+    def tearDown(self):
+        with app.app_context():
+            db.session.execute(db.delete(Ticket))
+            db.session.commit()
+    
+    def test_resolving_sets_resolved_at(self):
+        response = self.client.post(f"/tickets/{self.ticket_id}/update",
+                                    data={"status": "resolved", "priority": "high", "assigned_to": "0"})
+        self.assertEqual(response.status_code, 302)
+        with app.app_context():
+            ticket = db.session.get(Ticket, self.ticket_id)
+            self.assertEqual(ticket.status, "resolved")
+            self.assertIsNotNone(ticket.resolved_at)
+            self.assertIsNone(ticket.closed_at)
+
+class CursorTest(unittest.TestCase):
+    """Keyset pagination cursors taken from the query string"""
+    
+    def test_valid_cursor(self):
+        self.assertEqual(routes._decode_cursor("2020-01-01T00:00:00_42"), (datetime(2020, 1, 1), 42))
+    
+    def test_malformed_cursors_fall_back_to_first_page(self):
+        for cursor in (None, "", "garbage", "2020-01-01T00:00:00_", "2020-13-01T00:00:00_1",
+                       "2020-01-01T00:00:00_abc", "2020-01-01T00:00:00_99999999999999999999999"):
+            with self.subTest(cursor=cursor):
+                self.assertIsNone(routes._decode_cursor(cursor))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,114 +1,199 @@
 import os
+import json
 import logging
-from flask import current_app
-from flask_mail import Message
-from app import mail
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from werkzeug.security import generate_password_hash
+from sqlalchemy.orm import Session
+from app import app, db, cache, get_queue
+
+logger = logging.getLogger(__name__)
 
 # Allowed file extensions for uploads
-ALLOWED_EXTENSIONS = {'txt', 'pdf', 'png', 'jpg', 'jpeg', 'gif', 'doc', 'docx', 'xls', 'xlsx'}
+ALLOWED_EXTENSIONS = frozenset({'txt', 'pdf', 'png', 'jpg', 'jpeg', 'gif', 'doc', 'docx', 'xls', 'xlsx'})
 
 def allowed_file(filename):
     """Check if the uploaded file has an allowed extension"""
-    return '.' in filename and \
-           filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+    _, dot, extension = filename.rpartition('.')
+    return bool(dot) and extension.lower() in ALLOWED_EXTENSIONS
 
-def get_file_size(file_path):
-    """Get file size in bytes"""
+def hash_password(password):
+    """Hash a password with the configured method"""
+    return generate_password_hash(password, method=app.config['PASSWORD_HASH_METHOD'])
+
+def password_needs_rehash(password_hash):
+    """Check if a stored hash was made with a different method or cost than the configured one"""
+    return password_hash.split('$', 1)[0] != app.config['PASSWORD_HASH_METHOD']
+
+def save_upload(file, file_path, max_size=None):
+    """Stream an uploaded file to disk and return its size in bytes.
+    
+    Returns None (and removes the partial file) if it grows past max_size.
+    """
+    size = 0
+    with open(file_path, 'wb') as out:
+        while chunk := file.stream.read(65536):
+            size += len(chunk)
+            if max_size is not None and size > max_size:
+                break
+            out.write(chunk)
+    
+    if max_size is not None and size > max_size:
+        os.remove(file_path)
+        return None
+    return size
+
+def get_file_stat(file_path):
+    """Get (size in bytes, modification time) from a single stat call, or (0, 0) if missing"""
     try:
-        return os.path.getsize(file_path)
+        st = os.stat(file_path)
     except OSError:
-        return 0
+        return 0, 0
+    return st.st_size, st.st_mtime
+
+def get_file_size(file_path):
+    """Get file size in bytes"""
+    return get_file_stat(file_path)[0]
+
+# Sends notifications off the request thread when no RQ queue is configured
+_notification_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='notifications')
 
-def send_notification_email(ticket, notification_type, subject):
+def queue_notification_email(ticket_id, notification_type, subject):
+    """Send a notification email from the background queue, or a local thread pool if there is none"""
+    queue = get_queue()
+    if queue is not None:
+        queue.enqueue(notification_email_job, ticket_id, notification_type, subject, job_timeout=60)
+    else:
+        _notification_executor.submit(notification_email_job, ticket_id, notification_type, subject)
+
+def notification_email_job(ticket_id, notification_type, subject):
+    """Queue worker entry point: send the email inside an application context"""
+    with app.app_context():
+        send_notification_email(ticket_id, notification_type, subject)
+
+# Priorities that also notify every active admin
+HIGH_PRIORITIES = frozenset({'high', 'urgent'})
+
+@cache.memoize(timeout=300)
+def get_admin_emails():
+    """Emails of active admins (cached; cleared when an admin edits a user)"""
+    from models import User
+    # Only the email column: plain rows, no User objects
+    with Session(db.engine) as session:
+        rows = session.query(User.email).filter_by(role='admin', is_active=True).all()
+    return [row[0] for row in rows]
+
+def send_notification_email(ticket_id, notification_type, subject):
     """
     Send email notification for ticket events
     This is a mock implementation for the MVP - in production,
     you would implement actual email sending logic
     """
     try:
-        # Mock email notification - log instead of sending
-        recipients = []
-        
-        # Add ticket creator
-        recipients.append(ticket.creator.email)
+        # Look the ticket up by id: this may run in a worker, outside the request's session.
+        # One row of plain columns, recipient emails included; no ORM objects are built.
+        # The read uses its own short-lived session so the connection goes back to the pool
+        # straight away instead of staying checked out until the app context ends
+        from models import Ticket
+        with Session(db.engine) as session:
+            ticket = session.query(
+                Ticket.id, Ticket.subject, Ticket.status, Ticket.priority,
+                Ticket.creator_email, Ticket.assignee_email
+            ).filter_by(id=ticket_id).first()
+        if ticket is None:
+            return
         
-        # Add assigned agent if any
-        if ticket.assignee:
-            recipients.append(ticket.assignee.email)
+        # Mock email notification - log instead of sending
+        # Ticket creator, then the assigned agent if any
+        recipients = [ticket.creator_email, ticket.assignee_email] if ticket.assignee_email else [ticket.creator_email]
         
         # Add admins for high priority tickets
-        if ticket.priority in ['high', 'urgent']:
-            from models import User
-            admins = User.query.filter_by(role='admin', is_active=True).all()
-            recipients.extend([admin.email for admin in admins])
+        if ticket.priority in HIGH_PRIORITIES:
+            recipients += get_admin_emails()
         
-        # Remove duplicates
-        recipients = list(set(recipients))
+        # Remove duplicates, keeping the order
+        recipients = list(dict.fromkeys(recipients))
         
-        # Log the notification instead of sending actual email
-        logging.info(f"Email notification: {notification_type}")
-        logging.info(f"Subject: {subject}")
-        logging.info(f"Recipients: {', '.join(recipients)}")
-        logging.info(f"Ticket: #{ticket.id} - {ticket.subject}")
+        # Log the notification instead of sending actual email: one JSON record for log
+        # aggregators, built only if INFO is on (no args, so logging does no %-formatting)
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps({
+                'notification': notification_type,
+                'subject': subject,
+                'recipients': recipients,
+                'ticket_id': ticket.id,
+                'ticket_subject': ticket.subject
+            }))
         
         # Uncomment below for actual email sending in production
         """
-        if current_app.config.get('MAIL_USERNAME'):
+        if app.config.get('MAIL_USERNAME'):
+            from flask_mail import Message
+            from app import get_mail
             msg = Message(
                 subject=f"[QuickDesk] {subject}",
                 recipients=recipients,
                 body=f"Ticket #{ticket.id}: {ticket.subject}\n\nStatus: {ticket.status.title()}\nPriority: {ticket.priority.title()}\n\nView ticket: {url_for('view_ticket', id=ticket.id, _external=True)}"
             )
-            mail.send(msg)
+            get_mail().send(msg)
         """
         
     except Exception as e:
-        logging.error(f"Failed to send notification email: {str(e)}")
+        logger.error("Failed to send notification email: %s", e)
+
+FILE_SIZE_UNITS = ("B", "KB", "MB", "GB")
 
 def format_file_size(size_bytes):
     """Format file size in human readable format"""
-    if size_bytes == 0:
+    if size_bytes <= 0:
         return "0 B"
     
-    size_names = ["B", "KB", "MB", "GB"]
-    i = 0
-    while size_bytes >= 1024 and i < len(size_names) - 1:
-        size_bytes /= 1024.0
-        i += 1
+    # Each unit is 2**10 times the last, so the bit length picks the unit directly
+    i = min((int(size_bytes).bit_length() - 1) // 10, len(FILE_SIZE_UNITS) - 1)
+    return f"{size_bytes / (1 << (10 * i)):.1f} {FILE_SIZE_UNITS[i]}"
+
+class Lookup(dict):
+    """Dict whose missing keys map to missing(key) without being stored (unlike defaultdict)"""
+    def __init__(self, mapping, missing):
+        super().__init__(mapping)
+        self.missing = missing
     
-    return f"{size_bytes:.1f} {size_names[i]}"
+    def __missing__(self, key):
+        return self.missing(key)
+
+PRIORITY_COLORS = Lookup({
+    'low': 'secondary',
+    'medium': 'info',
+    'high': 'warning',
+    'urgent': 'danger'
+}, lambda priority: 'info')
+
+STATUS_COLORS = Lookup({
+    'open': 'primary',
+    'in_progress': 'warning',
+    'resolved': 'success',
+    'closed': 'secondary'
+}, lambda status: 'secondary')
+
+ROLE_NAMES = Lookup({
+    'user': 'End User',
+    'agent': 'Support Agent',
+    'admin': 'Administrator'
+}, str.title)
 
 def get_priority_color(priority):
     """Get Bootstrap color class for priority"""
-    colors = {
-        'low': 'secondary',
-        'medium': 'info',
-        'high': 'warning',
-        'urgent': 'danger'
-    }
-    return colors.get(priority, 'info')
+    return PRIORITY_COLORS[priority]
 
 def get_status_color(status):
     """Get Bootstrap color class for status"""
-    colors = {
-        'open': 'primary',
-        'in_progress': 'warning',
-        'resolved': 'success',
-        'closed': 'secondary'
-    }
-    return colors.get(status, 'secondary')
+    return STATUS_COLORS[status]
 
 def truncate_text(text, max_length=100):
     """Truncate text to specified length with ellipsis"""
-    if len(text) <= max_length:
-        return text
-    return text[:max_length - 3] + "..."
+    return text if len(text) <= max_length else text[:max_length - 3] + "..."
 
+@lru_cache(maxsize=8)
 def get_user_role_display(role):
-    """Get display name for user role"""
-    role_names = {
-        'user': 'End User',
-        'agent': 'Support Agent',
-        'admin': 'Administrator'
-    }
-    return role_names.get(role, role.title())
+    """Get display name for user role (there are only a handful, so every answer is cached)"""
+    return ROLE_NAMES[role]